@@ -18,11 +18,14 @@ Cách dùng:
 import argparse
 import asyncio
 import ctypes
+import ctypes.wintypes
+import os
 import socket
+import struct
 import time
-from typing import Dict, Tuple, Set, Optional
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Set, Optional
 import queue
+import re
 import threading
 
 import cv2
@@ -40,6 +43,57 @@ except ImportError:
     print("⚠️  dxcam không được cài đặt. Sử dụng mss (chậm hơn).")
     print("   Để cài đặt: pip install dxcam")
 
+# Thử import simplejpeg (gọi thẳng libjpeg-turbo, nhanh hơn cv2.imencode)
+try:
+    import simplejpeg
+    HAS_SIMPLEJPEG = True
+except ImportError:
+    HAS_SIMPLEJPEG = False
+    print("⚠️  simplejpeg không được cài đặt. Sử dụng cv2.imencode (chậm hơn).")
+    print("   Để cài đặt: pip install simplejpeg")
+
+# Thử import xxhash (phát hiện frame không đổi để bỏ qua encode)
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+    print("⚠️  xxhash không được cài đặt. Frame không đổi vẫn bị encode lại.")
+    print("   Để cài đặt: pip install xxhash")
+
+# Thử import uvloop (event loop libuv, chỉ có trên Linux/macOS) - tùy chọn
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
+# Thử import nvjpeg (encode JPEG bằng GPU NVIDIA) - tùy chọn, không cảnh báo
+try:
+    from nvjpeg import NvJpeg
+    HAS_NVJPEG = True
+except ImportError:
+    HAS_NVJPEG = False
+
+ENCODERS = ("auto", "nvjpeg", "simplejpeg", "cv2")
+CHROMA_SUBSAMPLINGS = ("420", "422", "444")
+
+# Các mức quality dùng để đo kích thước JPEG khi dựng bảng adaptive
+QUALITY_PROBES = (20, 40, 60, 80, 95)
+
+# Số frame (khác nhau) dùng để dựng bảng, mỗi frame encode thêm 1 mức quality mẫu
+CALIBRATION_FRAMES = 30
+
+# Chênh lệch KB/Mpix tối thiểu giữa quality 20 và 95 để bảng dùng được
+MIN_LUT_SPREAD = 1.5
+
+# Header 4 bytes (big-endian) chứa kích thước frame gửi qua raw socket
+FRAME_HEADER = struct.Struct(">I")
+
+# Windows scheduling constants
+THREAD_PRIORITY_HIGHEST = 2
+HIGH_PRIORITY_CLASS = 0x00000080
+
 
 # Cấu hình mặc định
 CONFIG = {
@@ -51,6 +105,10 @@ CONFIG = {
     "max_bandwidth_kbps": 500000,  # Bandwidth tối đa (KB/s) - 500MB/s for USB
     "adaptive": True,       # Tự động điều chỉnh quality theo bandwidth
     "use_dxcam": True,      # Sử dụng D3D11 Desktop Duplication (nếu có)
+    "encoder": "auto",      # JPEG encoder: auto, nvjpeg, simplejpeg, cv2
+    "chroma": "420",        # Chroma subsampling: 420 (nhẹ nhất), 422, 444
+    "capture_core": None,   # Ghim thread capture vào CPU core (None = không ghim)
+    "encode_core": None,    # Ghim thread encode vào CPU core (None = không ghim)
 }
 
 
@@ -66,14 +124,105 @@ def get_local_ip() -> str:
     return ip
 
 
-def get_cursor_pos() -> Tuple[int, int]:
-    """Lấy vị trí con trỏ chuột (Windows)."""
-    class POINT(ctypes.Structure):
-        _fields_ = [("x", ctypes.c_long), ("y", ctypes.c_long)]
+class _POINT(ctypes.Structure):
+    _fields_ = [("x", ctypes.c_long), ("y", ctypes.c_long)]
 
-    pt = POINT()
-    ctypes.windll.user32.GetCursorPos(ctypes.byref(pt))
-    return pt.x, pt.y
+
+# Chuẩn bị sẵn GetCursorPos và 1 POINT dùng lại cho mọi frame (chỉ Windows).
+# Dùng user32 riêng để không sửa argtypes của ctypes.windll.user32 dùng chung
+if hasattr(ctypes, "WinDLL"):
+    _GET_CURSOR_POS = ctypes.WinDLL("user32").GetCursorPos
+    _GET_CURSOR_POS.argtypes = [ctypes.POINTER(_POINT)]
+    _GET_CURSOR_POS.restype = ctypes.wintypes.BOOL
+else:
+    _GET_CURSOR_POS = None
+_cursor_pt = _POINT()
+
+# Vị trí trả về khi không lấy được con trỏ (không phải Windows): nằm ngoài
+# mọi monitor nên _draw_cursor sẽ bỏ qua, không vẽ con trỏ
+CURSOR_UNAVAILABLE = (-1 << 30, -1 << 30)
+
+# Cache vị trí con trỏ trong vài ms để các lần gọi sát nhau không gọi lại Win32
+CURSOR_CACHE_SECONDS = 0.008
+_cursor_cache: Tuple[float, int, int] = (-1.0, 0, 0)
+
+
+def get_cursor_pos() -> Tuple[int, int]:
+    """Lấy vị trí con trỏ chuột (Windows), CURSOR_UNAVAILABLE nếu không hỗ trợ."""
+    global _cursor_cache
+
+    if _GET_CURSOR_POS is None:
+        return CURSOR_UNAVAILABLE
+
+    now = time.perf_counter()
+    ts, x, y = _cursor_cache
+    if now - ts < CURSOR_CACHE_SECONDS:
+        return x, y
+
+    _GET_CURSOR_POS(ctypes.byref(_cursor_pt))
+    _cursor_cache = (now, _cursor_pt.x, _cursor_pt.y)
+    return _cursor_pt.x, _cursor_pt.y
+
+
+# kernel32 riêng với argtypes/restype của mình (chỉ Windows). Không sửa
+# ctypes.windll.kernel32 vì nó dùng chung với thư viện khác (dxcam, ...)
+if hasattr(ctypes, "WinDLL"):
+    _KERNEL32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _KERNEL32.GetCurrentThread.argtypes = []
+    _KERNEL32.GetCurrentThread.restype = ctypes.wintypes.HANDLE
+    _KERNEL32.SetThreadPriority.argtypes = [ctypes.wintypes.HANDLE, ctypes.c_int]
+    _KERNEL32.SetThreadPriority.restype = ctypes.wintypes.BOOL
+    _KERNEL32.SetThreadAffinityMask.argtypes = [ctypes.wintypes.HANDLE, ctypes.c_size_t]
+    _KERNEL32.SetThreadAffinityMask.restype = ctypes.c_size_t
+    _KERNEL32.GetCurrentProcess.argtypes = []
+    _KERNEL32.GetCurrentProcess.restype = ctypes.wintypes.HANDLE
+    _KERNEL32.SetPriorityClass.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.DWORD]
+    _KERNEL32.SetPriorityClass.restype = ctypes.wintypes.BOOL
+else:
+    _KERNEL32 = None
+
+# Affinity mask là 1 số c_size_t nên chỉ ghim được vào core < số bit của nó
+MAX_CPU_CORES = min(os.cpu_count() or 1, ctypes.sizeof(ctypes.c_size_t) * 8)
+
+
+def cpu_core(value: str) -> int:
+    """Kiểu argparse cho --capture-core/--encode-core: core trong [0, MAX_CPU_CORES)."""
+    core = int(value)
+    if not 0 <= core < MAX_CPU_CORES:
+        raise argparse.ArgumentTypeError(f"core phải nằm trong khoảng 0..{MAX_CPU_CORES - 1}")
+    return core
+
+
+def tune_current_thread(core: Optional[int]) -> None:
+    """Tăng priority và ghim thread hiện tại vào 1 CPU core (chỉ Windows)."""
+    if _KERNEL32 is None:
+        return  # Không phải Windows
+
+    # Chỉ là tối ưu, lỗi ở đây không được làm chết thread capture/encode
+    name = threading.current_thread().name
+    try:
+        handle = _KERNEL32.GetCurrentThread()
+        if not _KERNEL32.SetThreadPriority(handle, THREAD_PRIORITY_HIGHEST):
+            print(f"⚠️  {name}: SetThreadPriority failed (error {ctypes.get_last_error()})")
+        if core is not None:
+            if _KERNEL32.SetThreadAffinityMask(handle, 1 << core):
+                print(f"📌 {name} thread pinned to core {core}")
+            else:
+                print(f"⚠️  {name}: không ghim được vào core {core} "
+                      f"(error {ctypes.get_last_error()})")
+    except (ValueError, OverflowError, ctypes.ArgumentError) as e:
+        print(f"⚠️  {name}: không ghim được vào core {core}: {e}")
+
+
+def raise_process_priority() -> None:
+    """Đặt process sang HIGH_PRIORITY_CLASS (chỉ Windows)."""
+    if _KERNEL32 is None:
+        return  # Không phải Windows
+
+    if _KERNEL32.SetPriorityClass(_KERNEL32.GetCurrentProcess(), HIGH_PRIORITY_CLASS):
+        print("⚡ Process priority: HIGH")
+    else:
+        print("⚠️  Không đặt được process priority HIGH")
 
 
 def draw_cursor(frame: np.ndarray, cursor_x: int, cursor_y: int, region: Dict) -> np.ndarray:
@@ -125,7 +274,9 @@ class ScreenCapture:
 
     def __init__(self, region: Dict, fps: int, quality: int, scale: float = 1.0,
                  max_bandwidth_kbps: int = 3000, adaptive: bool = True,
-                 use_dxcam: bool = True, monitor_index: int = 0):
+                 use_dxcam: bool = True, monitor_index: int = 0,
+                 encoder: str = "auto", chroma: str = "420",
+                 capture_core: Optional[int] = None, encode_core: Optional[int] = None):
         self.region = region
         self.fps = fps
         self.base_quality = quality
@@ -136,15 +287,25 @@ class ScreenCapture:
         self.frame_interval = 1.0 / fps
         self._frame_count = 0
         self._monitor_index = monitor_index
+        self._capture_core = capture_core
+        self._encode_core = encode_core
         
         # Lưu offset của monitor để tính cursor position
         self._monitor_left = region["left"]
         self._monitor_top = region["top"]
         
-        # Thread pool cho capture (fallback cho mss)
-        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
         self._local = threading.local()
         
+        # Pipeline capture -> encode qua queue 1 phần tử (frame mới đè frame cũ)
+        self._capture_q: "queue.Queue[np.ndarray]" = queue.Queue(maxsize=1)
+        self._stop_event = threading.Event()
+        
+        # Frame JPEG mới nhất, dùng chung cho mọi client (encode 1 lần / frame).
+        # Thread encode báo frame mới cho event loop qua call_soon_threadsafe
+        self._latest = b""
+        self._frame_event = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
         # Tracking cho adaptive quality
         self._bytes_sent = 0
         self._last_bandwidth_check = time.perf_counter()
@@ -154,9 +315,49 @@ class ScreenCapture:
         # Pre-calculate scaled dimensions
         self.scaled_width = int(region["width"] * scale)
         self.scaled_height = int(region["height"] * scale)
+        self._megapixels = self.scaled_width * self.scaled_height / 1e6
+        
+        # Adaptive quality dự đoán: bảng quality -> KB/Mpix đo trên các frame đầu tiên,
+        # cộng EWMA nhanh/chậm của độ phức tạp nội dung so với bảng đó
+        self._size_lut: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._probe_qualities = [q for q in QUALITY_PROBES if q < quality] + [quality]
+        self._probe_samples: List[List[float]] = [[] for _ in self._probe_qualities]
+        self._probe_count = 0
+        self._complexity_fast = 1.0
+        self._complexity_slow = 1.0
         
-        # Pre-allocate encode params
-        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        # JPEG gần nhất và khóa (hash frame, con trỏ, quality) để dùng lại khi màn hình đứng yên
+        self._last_key: Optional[Tuple[int, Tuple[int, int], int]] = None
+        self._last_jpeg = b""
+        
+        # scale = 1.0 thì bỏ qua resize hoàn toàn. Khi thu nhỏ dùng INTER_AREA
+        # (ít răng cưa -> JPEG nhỏ hơn), scale gần 1 thì INTER_LINEAR là đủ
+        self._needs_resize = scale < 1.0
+        self._interp = cv2.INTER_LINEAR if scale > 0.75 else cv2.INTER_AREA
+        # Buffer đích cho resize, dùng lại mỗi frame thay vì cấp phát mới
+        self._resize_buf: Optional[np.ndarray] = None
+        
+        # Chroma 4:2:0 giảm một nửa dữ liệu màu cần DCT/Huffman so với 4:4:4
+        self.chroma = chroma
+        self._cv2_extra_params = [int(cv2.IMWRITE_JPEG_OPTIMIZE), 0]
+        if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):  # OpenCV >= 4.7
+            self._cv2_extra_params += [
+                int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR),
+                int(getattr(cv2, f"IMWRITE_JPEG_SAMPLING_FACTOR_{chroma}")),
+            ]
+        
+        # Chọn JPEG encoder (GPU nếu có, không thì CPU)
+        self._nvjpeg = None
+        self._bgr_buf: Optional[np.ndarray] = None  # Buffer BGRA -> BGR cho nvjpeg/cv2
+        self.encoder = self._select_encoder(encoder)
+        self._encode = {
+            "nvjpeg": self._encode_nvjpeg,
+            "simplejpeg": self._encode_simplejpeg,
+            "cv2": self._encode_cv2,
+        }[self.encoder]
+        
+        # Pre-rasterize con trỏ chuột một lần, mỗi frame chỉ cần blit bằng numpy
+        self._cursor_bgr, self._cursor_mask = self._build_cursor_sprite(int(16 * scale))
         
         # Khởi tạo dxcam nếu có
         self._dxcam_camera = None
@@ -164,43 +365,19 @@ class ScreenCapture:
         
         if use_dxcam and HAS_DXCAM:
             try:
-                # dxcam.output_info() trả về string, không phải list
-                # Cần parse hoặc probe để tìm devices/outputs có sẵn
+                # dxcam.output_info() trả về string, không phải list, dạng:
+                #   Device[0] Output[0]: Res:(1920, 1080) Rot:0 Primary:True
+                # Parse string này thay vì tạo thử camera cho từng output
+                # (mỗi lần tạo giữ 1 DXGI duplication, có thể làm lần tạo thật bị lỗi)
                 outputs_str = str(dxcam.output_info())
                 print(f"dxcam outputs:\n{outputs_str}")
                 
-                # Probe để tìm tất cả devices và outputs có sẵn
-                # Thử tạo camera với device_idx tăng dần cho đến khi lỗi
-                output_mapping = []
-                for dev_idx in range(10):  # Tối đa 10 devices
-                    for out_idx in range(10):  # Tối đa 10 outputs per device
-                        try:
-                            # Thử tạo camera để kiểm tra device/output có tồn tại
-                            test_cam = dxcam.create(
-                                device_idx=dev_idx,
-                                output_idx=out_idx,
-                                output_color="BGR"
-                            )
-                            if test_cam is not None:
-                                # Lấy thông tin về output này
-                                output_mapping.append((dev_idx, out_idx))
-                                # Đóng camera test
-                                del test_cam
-                                # dxcam có thể cache, cần reset
-                                import gc
-                                gc.collect()
-                        except Exception:
-                            # Không có output này, thử output tiếp theo
-                            if out_idx == 0:
-                                # Nếu output 0 không tồn tại, device này không có
-                                break
-                            continue
-                    # Nếu device này không có output nào, dừng probe devices
-                    if not any(d == dev_idx for d, o in output_mapping):
-                        if dev_idx > 0:
-                            break
+                output_mapping = [
+                    (int(dev), int(out))
+                    for dev, out in re.findall(r"Device\[(\d+)\]\s*Output\[(\d+)\]", outputs_str)
+                ]
                 
-                # Nếu probe không tìm được gì, thử mặc định device 0, output 0
+                # Nếu parse không tìm được gì, thử mặc định device 0, output 0
                 if not output_mapping:
                     output_mapping = [(0, 0)]
                 
@@ -246,8 +423,40 @@ class ScreenCapture:
         if not self._use_dxcam:
             print("📺 Using mss (GDI) for screen capture")
         
+        if self.encoder == "nvjpeg":
+            # Binding nvjpeg không có tùy chọn chroma subsampling
+            print("🗜️  JPEG encoder: nvjpeg")
+            if self.chroma != "420":
+                print(f"⚠️  nvjpeg bỏ qua --chroma {self.chroma}, dùng subsampling mặc định của nvjpeg")
+        else:
+            print(f"🗜️  JPEG encoder: {self.encoder} (chroma {self.chroma})")
         print(f"Target frame size: {self._target_frame_size_kb:.1f} KB @ {fps} FPS")
         print(f"Output resolution: {self.scaled_width}x{self.scaled_height}")
+        
+        # Capture và encode chạy song song trên 2 thread riêng
+        self._capture_thread = threading.Thread(
+            target=self._capture_loop, name="capture", daemon=True
+        )
+        self._encode_thread = threading.Thread(
+            target=self._encode_loop, name="encode", daemon=True
+        )
+        self._capture_thread.start()
+        self._encode_thread.start()
+
+    def _select_encoder(self, encoder: str) -> str:
+        """Chọn encoder khả dụng, fallback nvjpeg -> simplejpeg -> cv2."""
+        if encoder in ("auto", "nvjpeg") and HAS_NVJPEG:
+            try:
+                self._nvjpeg = NvJpeg()
+                return "nvjpeg"
+            except Exception as e:
+                print(f"⚠️  nvjpeg initialization failed: {e}")
+        elif encoder == "nvjpeg":
+            print("⚠️  nvjpeg không được cài đặt. Để cài đặt: pip install pynvjpeg")
+
+        if encoder != "cv2" and HAS_SIMPLEJPEG:
+            return "simplejpeg"
+        return "cv2"
 
     def _get_sct(self) -> mss.mss:
         """Lấy mss instance cho thread hiện tại (thread-local)."""
@@ -255,17 +464,73 @@ class ScreenCapture:
             self._local.sct = mss.mss()
         return self._local.sct
 
+    def _calibrate_quality(self, frame: np.ndarray):
+        """Encode thêm frame ở 1 mức quality mẫu (xoay vòng), đủ mẫu thì dựng bảng quality -> KB/Mpix."""
+        index = self._probe_count % len(self._probe_qualities)
+        current_quality = self.quality
+        self.quality = self._probe_qualities[index]
+        self._probe_samples[index].append(len(self._encode(frame)) / 1024 / self._megapixels)
+        self.quality = current_quality
+        
+        self._probe_count += 1
+        if self._probe_count < max(CALIBRATION_FRAMES, len(self._probe_qualities)):
+            return
+        
+        qualities = np.array(self._probe_qualities, dtype=np.float64)
+        kb_per_mpix = np.array([np.median(samples) for samples in self._probe_samples])
+        self._probe_samples = [[] for _ in self._probe_qualities]
+        self._probe_count = 0
+        
+        # Bảng không dùng được thì đo lại trên các frame tiếp theo
+        if self._is_usable_lut(qualities, kb_per_mpix):
+            self._size_lut = (qualities, kb_per_mpix)
+            print(f"Adaptive quality: KB/Mpix {np.round(kb_per_mpix, 1).tolist()} "
+                  f"@ quality {self._probe_qualities}")
+
+    @staticmethod
+    def _is_usable_lut(qualities: np.ndarray, kb_per_mpix: np.ndarray) -> bool:
+        """Bảng chỉ nội suy ngược được khi kích thước tăng ngặt theo quality và đủ chênh lệch."""
+        if np.any(np.diff(kb_per_mpix) <= 0):
+            return False
+        
+        # Frame gần như đồng màu (màn hình đen/khóa) cho bảng gần phẳng -> quality nhảy 20 <-> max.
+        # Khoảng quality mẫu hẹp (base quality thấp) thì yêu cầu chênh lệch nhỏ hơn tương ứng
+        min_spread = MIN_LUT_SPREAD ** ((qualities[-1] - qualities[0]) / (95 - 20))
+        return kb_per_mpix[-1] >= kb_per_mpix[0] * min_spread
+
     def _adjust_quality(self, frame_size_kb: float):
-        """Điều chỉnh quality dựa trên kích thước frame thực tế."""
+        """Chọn quality dự đoán sẽ vừa target frame size (dựa trên bảng + EWMA)."""
         if not self.adaptive:
             return
         
-        if frame_size_kb > self._target_frame_size_kb * 1.2:
-            self.quality = max(20, self.quality - 5)
-            self._encode_params[1] = self.quality
-        elif frame_size_kb < self._target_frame_size_kb * 0.7:
-            self.quality = min(self.base_quality, self.quality + 2)
-            self._encode_params[1] = self.quality
+        # Chưa có bảng dùng được: chỉnh từng bước nhỏ, có giới hạn
+        if self._size_lut is None:
+            if frame_size_kb > self._target_frame_size_kb * 1.2:
+                self.quality = min(self.base_quality, max(20, self.quality - 5))
+            elif frame_size_kb < self._target_frame_size_kb * 0.7:
+                self.quality = min(self.base_quality, self.quality + 2)
+            return
+        
+        qualities, kb_per_mpix = self._size_lut
+        
+        # Độ phức tạp nội dung = kích thước thực / kích thước bảng dự đoán ở quality hiện tại
+        expected_kb = float(np.interp(self.quality, qualities, kb_per_mpix)) * self._megapixels
+        ratio = frame_size_kb / max(expected_kb, 1e-6)
+        self._complexity_fast += 0.25 * (ratio - self._complexity_fast)
+        self._complexity_slow += 0.02 * (ratio - self._complexity_slow)
+        
+        # Nội dung phức tạp lên thì phản ứng ngay (EWMA nhanh), đơn giản đi thì
+        # tăng quality từ từ (EWMA chậm) -> không dao động sau 1 frame lớn
+        complexity = max(self._complexity_fast, self._complexity_slow)
+        
+        # Dự đoán đã sát target thì giữ nguyên quality (tránh nhảy qua lại giữa 2 mức)
+        predicted_kb = expected_kb * complexity
+        if self._target_frame_size_kb * 0.8 <= predicted_kb <= self._target_frame_size_kb:
+            return
+        
+        target_kb_per_mpix = self._target_frame_size_kb / (self._megapixels * complexity)
+        quality = int(np.interp(target_kb_per_mpix, kb_per_mpix, qualities))
+        self.quality = min(self.base_quality, max(20, quality))
 
     def _capture_dxcam(self) -> Optional[np.ndarray]:
         """Capture frame bằng dxcam (D3D11 Desktop Duplication)."""
@@ -281,17 +546,41 @@ class ScreenCapture:
         sct = self._get_sct()
         img = sct.grab(self.region)
         
-        # Convert to numpy
-        frame = np.frombuffer(img.bgra, dtype=np.uint8).reshape(
+        # Giữ nguyên BGRA (không copy để bỏ kênh alpha), encoder tự bỏ qua byte X.
+        # img.raw là bytearray nên frame ghi được (img.bgra là bản copy read-only)
+        return np.frombuffer(img.raw, dtype=np.uint8).reshape(
             img.height, img.width, 4
         )
-        # BGRA -> BGR
-        frame = np.ascontiguousarray(frame[:, :, :3])
-        return frame
 
-    def _draw_cursor(self, frame: np.ndarray) -> np.ndarray:
-        """Vẽ con trỏ chuột lên frame."""
-        cursor_x, cursor_y = get_cursor_pos()
+    @staticmethod
+    def _build_cursor_sprite(size: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Vẽ sẵn con trỏ (BGR) và mask của nó, trả về (None, None) nếu quá nhỏ."""
+        if size < 4:
+            return None, None
+
+        pts = np.array([
+            [0, 0],
+            [0, size],
+            [int(size * 0.6), int(size * 0.75)],
+        ], np.int32)
+        height, width = size + 1, int(size * 0.6) + 1
+
+        sprite = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.fillPoly(sprite, [pts], (255, 255, 255))
+        cv2.polylines(sprite, [pts], isClosed=True, color=(0, 0, 0), thickness=1)
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [pts], 255)
+        cv2.polylines(mask, [pts], isClosed=True, color=255, thickness=1)
+
+        return sprite, (mask > 0)[:, :, np.newaxis]
+
+    def _draw_cursor(self, frame: np.ndarray, cursor: Tuple[int, int]) -> np.ndarray:
+        """Vẽ con trỏ chuột lên frame tại vị trí cursor (tọa độ desktop)."""
+        if self._cursor_bgr is None:
+            return frame
+
+        cursor_x, cursor_y = cursor
         
         # Tính vị trí tương đối của cursor trên monitor đang capture
         # Windows cursor position là tọa độ tuyệt đối trên desktop ảo
@@ -300,127 +589,282 @@ class ScreenCapture:
         rel_y = int((cursor_y - self._monitor_top) * self.scale)
         
         if 0 <= rel_x < self.scaled_width and 0 <= rel_y < self.scaled_height:
-            size = int(16 * self.scale)
-            if size >= 4:
-                pts = np.array([
-                    [rel_x, rel_y],
-                    [rel_x, rel_y + size],
-                    [rel_x + int(size * 0.6), rel_y + int(size * 0.75)],
-                ], np.int32)
-                cv2.fillPoly(frame, [pts], (255, 255, 255))
-                cv2.polylines(frame, [pts], isClosed=True, color=(0, 0, 0), thickness=1)
+            # Cắt sprite nếu con trỏ nằm sát mép phải/dưới
+            x_end = min(rel_x + self._cursor_bgr.shape[1], frame.shape[1])
+            y_end = min(rel_y + self._cursor_bgr.shape[0], frame.shape[0])
+            w, h = x_end - rel_x, y_end - rel_y
+            # Chỉ ghi 3 kênh màu, frame BGRA (mss) giữ nguyên byte X
+            np.copyto(frame[rel_y:y_end, rel_x:x_end, :3], self._cursor_bgr[:h, :w],
+                      where=self._cursor_mask[:h, :w])
         
         return frame
 
-    def _capture_and_encode(self) -> bytes:
-        """Capture và encode frame (chạy trong thread pool)."""
-        # Capture frame
+    def _capture_frame(self) -> Optional[np.ndarray]:
+        """Capture một frame thô từ backend đang dùng."""
         if self._use_dxcam:
-            frame = self._capture_dxcam()
-            if frame is None:
-                # Nếu dxcam trả về None, thử lại
-                return b""
-        else:
-            frame = self._capture_mss()
+            return self._capture_dxcam()
+        return self._capture_mss()
+
+    def _encode_frame(self, frame: np.ndarray) -> bytes:
+        """Scale, vẽ con trỏ và encode frame thành JPEG."""
+        # Đọc con trỏ 1 lần: cùng giá trị cho khóa cache và cho lúc vẽ
+        # (resize có thể lâu hơn thời gian cache của get_cursor_pos)
+        cursor = get_cursor_pos()
         
+        # Hash toàn bộ frame (xxh3 ~0.5ms cho 1080p, rẻ hơn nhiều so với encode).
+        # Không lấy mẫu thưa vì sẽ bỏ sót thay đổi nhỏ như gõ 1 ký tự
+        key = None
+        if HAS_XXHASH and frame.flags.c_contiguous:
+            key = (xxhash.xxh3_64_intdigest(frame), cursor, self.quality)
+            if key == self._last_key and self._last_jpeg:
+                return self._last_jpeg
+
         # Scale nếu cần
-        if self.scale < 1.0:
+        if self._needs_resize:
+            # Số kênh phụ thuộc backend: dxcam BGR, mss BGRA
+            if self._resize_buf is None or self._resize_buf.shape[2] != frame.shape[2]:
+                self._resize_buf = np.empty(
+                    (self.scaled_height, self.scaled_width, frame.shape[2]), dtype=np.uint8
+                )
             frame = cv2.resize(frame, (self.scaled_width, self.scaled_height),
-                               interpolation=cv2.INTER_NEAREST)
+                               dst=self._resize_buf, interpolation=self._interp)
 
         # Vẽ con trỏ chuột
-        frame = self._draw_cursor(frame)
+        frame = self._draw_cursor(frame, cursor)
+
+        if self.adaptive and self._size_lut is None:
+            self._calibrate_quality(frame)
 
         # Encode JPEG
-        ok, buffer = cv2.imencode(".jpg", frame, self._encode_params)
-        
+        frame_bytes = self._encode(frame)
+        self._last_key = key
+        self._last_jpeg = frame_bytes
+        return frame_bytes
+
+    def _to_bgr(self, frame: np.ndarray) -> np.ndarray:
+        """Chuyển BGRA -> BGR bằng cvtColor (SIMD) vào buffer dùng lại giữa các frame."""
+        if frame.shape[2] == 3:
+            return frame
+        if self._bgr_buf is None or self._bgr_buf.shape[:2] != frame.shape[:2]:
+            self._bgr_buf = np.empty((frame.shape[0], frame.shape[1], 3), dtype=np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=self._bgr_buf)
+
+    def _encode_nvjpeg(self, frame: np.ndarray) -> bytes:
+        """Encode JPEG bằng GPU NVIDIA (nvjpeg chỉ nhận BGR)."""
+        frame = self._to_bgr(frame)
+        return self._nvjpeg.encode(np.ascontiguousarray(frame), int(self.quality))
+
+    def _encode_simplejpeg(self, frame: np.ndarray) -> bytes:
+        """Encode JPEG bằng simplejpeg (libjpeg-turbo), nhận cả BGR và BGRA."""
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame),
+            quality=int(self.quality),
+            colorspace="BGRX" if frame.shape[2] == 4 else "BGR",
+            colorsubsampling=self.chroma,
+            fastdct=True,
+        )
+
+    def _encode_cv2(self, frame: np.ndarray) -> bytes:
+        """Encode JPEG bằng cv2.imencode (fallback)."""
+        frame = self._to_bgr(frame)
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), int(self.quality)] + self._cv2_extra_params
+        ok, buffer = cv2.imencode(".jpg", frame, params)
         if ok:
             return buffer.tobytes()
         return b""
 
-    async def capture_frame_async(self) -> bytes:
-        """Capture frame async (không block event loop)."""
-        loop = asyncio.get_event_loop()
-        frame_bytes = await loop.run_in_executor(self._executor, self._capture_and_encode)
+    @staticmethod
+    def _put_latest(q: queue.Queue, item) -> None:
+        """Đẩy item vào queue 1 phần tử, bỏ item cũ nếu consumer chưa lấy."""
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(item)
+
+    def _capture_loop(self):
+        """Thread capture: liên tục lấy frame mới nhất và đẩy sang thread encode."""
+        tune_current_thread(self._capture_core)
+        while not self._stop_event.is_set():
+            start_time = time.perf_counter()
+            try:
+                frame = self._capture_frame()
+            except Exception as e:
+                print(f"Capture error: {e}")
+                frame = None
+
+            if frame is not None:
+                self._put_latest(self._capture_q, frame)
+
+            # dxcam tự giới hạn theo target_fps, mss thì phải tự chờ
+            if not self._use_dxcam or frame is None:
+                sleep_time = self.frame_interval - (time.perf_counter() - start_time)
+                if sleep_time > 0:
+                    self._stop_event.wait(sleep_time)
+
+    def _encode_loop(self):
+        """Thread encode: encode frame mới nhất từ thread capture."""
+        tune_current_thread(self._encode_core)
+        while not self._stop_event.is_set():
+            try:
+                frame = self._capture_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                frame_bytes = self._encode_frame(frame)
+            except Exception as e:
+                print(f"Encode error: {e}")
+                continue
+
+            if frame_bytes:
+                self._record_frame(frame_bytes)
+                self._latest = frame_bytes
+                loop = self._loop
+                if loop is not None:
+                    try:
+                        loop.call_soon_threadsafe(self._frame_event.set)
+                    except RuntimeError:
+                        # Event loop đã đóng (đang thoát chương trình)
+                        pass
+
+    def _record_frame(self, frame_bytes: bytes):
+        """Điều chỉnh quality và thống kê FPS/bandwidth cho mỗi frame đã encode."""
+        frame_size_kb = len(frame_bytes) / 1024
         
-        if frame_bytes:
-            frame_size_kb = len(frame_bytes) / 1024
-            
-            # Adaptive quality adjustment
-            self._adjust_quality(frame_size_kb)
-            
-            # Tracking bandwidth
-            self._bytes_sent += len(frame_bytes)
-            self._frame_count += 1
-            
-            now = time.perf_counter()
-            elapsed = now - self._last_bandwidth_check
-            if elapsed >= 1.0:
-                self._current_bandwidth_kbps = self._bytes_sent / 1024 / elapsed
-                actual_fps = self._frame_count / elapsed
-                backend = "D3D11" if self._use_dxcam else "MSS"
-                print(f"FPS: {actual_fps:.1f} | {self.scaled_width}x{self.scaled_height} | Q:{self.quality} | "
-                      f"{frame_size_kb:.0f}KB/f | BW:{self._current_bandwidth_kbps:.0f}KB/s | {backend}")
-                self._bytes_sent = 0
-                self._frame_count = 0
-                self._last_bandwidth_check = now
+        # Adaptive quality adjustment
+        self._adjust_quality(frame_size_kb)
         
-        return frame_bytes
+        # Tracking bandwidth
+        self._bytes_sent += len(frame_bytes)
+        self._frame_count += 1
+        
+        now = time.perf_counter()
+        elapsed = now - self._last_bandwidth_check
+        if elapsed >= 1.0:
+            self._current_bandwidth_kbps = self._bytes_sent / 1024 / elapsed
+            actual_fps = self._frame_count / elapsed
+            backend = "D3D11" if self._use_dxcam else "MSS"
+            print(f"FPS: {actual_fps:.1f} | {self.scaled_width}x{self.scaled_height} | Q:{self.quality} | "
+                  f"{frame_size_kb:.0f}KB/f | BW:{self._current_bandwidth_kbps:.0f}KB/s | {backend}")
+            self._bytes_sent = 0
+            self._frame_count = 0
+            self._last_bandwidth_check = now
+
+    async def capture_frame_async(self) -> bytes:
+        """Chờ thread encode báo có frame JPEG mới rồi trả về frame mới nhất."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        await self._frame_event.wait()
+        self._frame_event.clear()
+        return self._latest
 
     def shutdown(self):
         """Cleanup resources."""
-        self._executor.shutdown(wait=False)
+        self._stop_event.set()
+        self._encode_thread.join(timeout=1.0)
         if self._dxcam_camera is not None:
             try:
                 self._dxcam_camera.stop()
             except Exception:
                 pass
-            self._dxcam_camera = None
+        # Chỉ bỏ camera sau khi thread capture đã dừng hẳn
+        self._capture_thread.join(timeout=1.0)
+        self._dxcam_camera = None
 
 
 # Global state
 region: Dict = {}
 active_websockets: Set[web.WebSocketResponse] = set()
+# Queue frame của từng client (WebSocket + raw socket), broadcaster đẩy frame vào
+frame_queues: Set[asyncio.Queue] = set()
 
 # Shared ScreenCapture instance
 _shared_capture: Optional[ScreenCapture] = None
-_capture_lock = asyncio.Lock() if hasattr(asyncio, 'Lock') else None
+_broadcast_task: Optional[asyncio.Task] = None
+# Lock tạo lazy trong event loop đang chạy (không tạo lúc import module)
+_capture_lock: Optional[asyncio.Lock] = None
 _capture_ref_count = 0
 
 
+def _offer_frame(frames: asyncio.Queue, frame_data: bytes):
+    """Đẩy frame vào queue của client, bỏ frame cũ nếu client gửi chưa kịp."""
+    if frames.full():
+        frames.get_nowait()
+    frames.put_nowait(frame_data)
+
+
+async def _broadcaster(capture: ScreenCapture):
+    """Encode 1 lần / frame rồi phát cùng một bytes object cho mọi client."""
+    while True:
+        frame_data = await capture.capture_frame_async()
+        for frames in frame_queues:
+            _offer_frame(frames, frame_data)
+
+
+def _get_capture_lock() -> asyncio.Lock:
+    """Lấy lock bảo vệ shared capture + ref count, tạo mới nếu chưa có."""
+    global _capture_lock
+    if _capture_lock is None:
+        _capture_lock = asyncio.Lock()
+    return _capture_lock
+
+
 async def get_shared_capture() -> ScreenCapture:
     """Lấy shared ScreenCapture instance, tạo mới nếu chưa có."""
-    global _shared_capture, _capture_ref_count
-    
-    if _shared_capture is None:
-        _shared_capture = ScreenCapture(
-            region=region,
-            fps=CONFIG["fps"],
-            quality=CONFIG["quality"],
-            scale=CONFIG["scale"],
-            max_bandwidth_kbps=CONFIG["max_bandwidth_kbps"],
-            adaptive=CONFIG["adaptive"],
-            use_dxcam=CONFIG["use_dxcam"],
-            monitor_index=CONFIG["monitor_index"] or 0
-        )
+    global _shared_capture, _broadcast_task, _capture_ref_count
     
-    _capture_ref_count += 1
-    print(f"Capture ref count: {_capture_ref_count}")
-    return _shared_capture
+    # Giữ lock để dxcam không bị khởi tạo 2 lần và không nhận nhầm
+    # instance đang bị release_shared_capture() shutdown
+    async with _get_capture_lock():
+        if _shared_capture is None:
+            _shared_capture = ScreenCapture(
+                region=region,
+                fps=CONFIG["fps"],
+                quality=CONFIG["quality"],
+                scale=CONFIG["scale"],
+                max_bandwidth_kbps=CONFIG["max_bandwidth_kbps"],
+                adaptive=CONFIG["adaptive"],
+                use_dxcam=CONFIG["use_dxcam"],
+                monitor_index=CONFIG["monitor_index"] or 0,
+                encoder=CONFIG["encoder"],
+                chroma=CONFIG["chroma"],
+                capture_core=CONFIG["capture_core"],
+                encode_core=CONFIG["encode_core"]
+            )
+            _broadcast_task = asyncio.create_task(_broadcaster(_shared_capture))
+        
+        _capture_ref_count += 1
+        print(f"Capture ref count: {_capture_ref_count}")
+        return _shared_capture
 
 
 async def release_shared_capture():
     """Giảm ref count, shutdown nếu không còn client nào."""
-    global _shared_capture, _capture_ref_count
+    global _shared_capture, _broadcast_task, _capture_ref_count
     
-    _capture_ref_count -= 1
-    print(f"Capture ref count: {_capture_ref_count}")
-    
-    if _capture_ref_count <= 0:
-        if _shared_capture is not None:
-            _shared_capture.shutdown()
-            _shared_capture = None
-        _capture_ref_count = 0
+    async with _get_capture_lock():
+        _capture_ref_count -= 1
+        print(f"Capture ref count: {_capture_ref_count}")
+        
+        if _capture_ref_count <= 0:
+            if _broadcast_task is not None:
+                _broadcast_task.cancel()
+                try:
+                    await _broadcast_task
+                except asyncio.CancelledError:
+                    pass
+                _broadcast_task = None
+            if _shared_capture is not None:
+                # shutdown() join các thread pipeline (có thể tới vài giây), chạy
+                # ngoài event loop nhưng vẫn giữ lock để client mới không nhận
+                # instance đang dừng dở
+                await asyncio.to_thread(_shared_capture.shutdown)
+                _shared_capture = None
+            _capture_ref_count = 0
 
 
 # Raw socket server cho Android app
@@ -429,32 +873,28 @@ async def handle_raw_client(reader: asyncio.StreamReader, writer: asyncio.Stream
     addr = writer.get_extra_info('peername')
     print(f"📱 Raw socket connected: {addr}")
     
-    capture = await get_shared_capture()
+    await get_shared_capture()
+    frames: asyncio.Queue = asyncio.Queue(maxsize=1)
+    frame_queues.add(frames)
     
     try:
         while True:
-            start_time = time.perf_counter()
-            
-            # Capture frame
-            frame_data = await capture.capture_frame_async()
+            # Chờ broadcaster đẩy frame mới
+            frame_data = await frames.get()
             
-            if frame_data:
-                # Gửi: 4 bytes kích thước (big-endian) + dữ liệu JPEG
-                size_bytes = len(frame_data).to_bytes(4, byteorder='big')
-                writer.write(size_bytes + frame_data)
-                await writer.drain()
-            
-            # FPS control
-            elapsed = time.perf_counter() - start_time
-            sleep_time = capture.frame_interval - elapsed
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
+            # Gửi: 4 bytes kích thước (big-endian) + dữ liệu JPEG
+            # writelines tránh nối bytes (copy cả frame chỉ để thêm 4 bytes).
+            # Header phải là bytes mới mỗi frame: transport có thể còn giữ
+            # tham chiếu tới header cũ chưa gửi, ghi đè bytearray sẽ hỏng stream
+            writer.writelines((FRAME_HEADER.pack(len(frame_data)), frame_data))
+            await writer.drain()
                 
     except (ConnectionResetError, BrokenPipeError, asyncio.CancelledError):
         pass
     except Exception as e:
         print(f"Raw socket error: {e}")
     finally:
+        frame_queues.discard(frames)
         await release_shared_capture()
         writer.close()
         try:
@@ -635,54 +1075,35 @@ async def index(request: web.Request) -> web.Response:
 
 
 async def websocket_handler(request: web.Request) -> web.WebSocketResponse:
-    """Xử lý kết nối WebSocket và stream frames với pipelining."""
-    ws = web.WebSocketResponse()
+    """Xử lý kết nối WebSocket và stream frames từ broadcaster."""
+    # JPEG đã nén sẵn, tắt permessage-deflate để không tốn CPU nén lại vô ích
+    ws = web.WebSocketResponse(compress=False)
     await ws.prepare(request)
 
     active_websockets.add(ws)
     print(f"WebSocket connected. Active: {len(active_websockets)}")
 
-    # Dùng shared capture instance
-    capture = await get_shared_capture()
+    # Dùng shared capture instance, nhận frame qua queue riêng của client
+    await get_shared_capture()
+    frames: asyncio.Queue = asyncio.Queue(maxsize=1)
+    frame_queues.add(frames)
 
     try:
-        # Pipelining: bắt đầu capture frame đầu tiên
-        next_frame_task = asyncio.create_task(capture.capture_frame_async())
-        
         while not ws.closed:
-            start_time = time.perf_counter()
-            
-            # Lấy frame đã capture
-            frame_data = await next_frame_task
-            
-            # Bắt đầu capture frame tiếp theo ngay lập tức (pipeline)
-            next_frame_task = asyncio.create_task(capture.capture_frame_async())
+            # Chờ broadcaster đẩy frame mới (client chậm thì frame cũ bị bỏ)
+            frame_data = await frames.get()
             
-            # Gửi frame hiện tại
-            if frame_data:
-                try:
-                    await ws.send_bytes(frame_data)
-                except ConnectionResetError:
-                    break
-
-            # Tính thời gian chờ
-            elapsed = time.perf_counter() - start_time
-            sleep_time = capture.frame_interval - elapsed
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
+            try:
+                await ws.send_bytes(frame_data)
+            except ConnectionResetError:
+                break
 
     except asyncio.CancelledError:
         pass
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        # Cancel pending task
-        if not next_frame_task.done():
-            next_frame_task.cancel()
-            try:
-                await next_frame_task
-            except asyncio.CancelledError:
-                pass
+        frame_queues.discard(frames)
         
         # Giảm ref count, chỉ shutdown khi không còn client nào
         await release_shared_capture()
@@ -706,6 +1127,9 @@ Ví dụ:
   python secondScreen_ws.py --usb --quality 70 --fps 60   # Quality 70%, 60 FPS
   python secondScreen_ws.py --no-adaptive --quality 50    # Tắt adaptive, cố định quality
   python secondScreen_ws.py --no-dxcam                    # Dùng mss thay vì D3D11
+  python secondScreen_ws.py --encoder nvjpeg              # Encode JPEG bằng GPU NVIDIA
+  python secondScreen_ws.py --chroma 444                  # Màu đầy đủ (chữ màu nét hơn, tốn bandwidth)
+  python secondScreen_ws.py --usb --capture-core 2 --encode-core 3  # Ghim thread vào core
         """
     )
     parser.add_argument("--usb", action="store_true", help="Chế độ USB (tối ưu latency)")
@@ -715,6 +1139,14 @@ Ví dụ:
     parser.add_argument("--bandwidth", type=int, default=500000, help="Max bandwidth KB/s (mặc định: 500000)")
     parser.add_argument("--no-adaptive", action="store_true", help="Tắt adaptive quality")
     parser.add_argument("--no-dxcam", action="store_true", help="Không dùng D3D11 (dùng mss)")
+    parser.add_argument("--encoder", choices=ENCODERS, default="auto",
+                        help="JPEG encoder (mặc định: auto = nvjpeg > simplejpeg > cv2)")
+    parser.add_argument("--chroma", choices=CHROMA_SUBSAMPLINGS, default="420",
+                        help="JPEG chroma subsampling (mặc định: 420)")
+    parser.add_argument("--capture-core", type=cpu_core, default=None,
+                        help="Ghim thread capture vào CPU core N (Windows)")
+    parser.add_argument("--encode-core", type=cpu_core, default=None,
+                        help="Ghim thread encode vào CPU core M (Windows)")
     parser.add_argument("--port", type=int, default=8080, help="Port HTTP/WebSocket (mặc định: 8080)")
     parser.add_argument("--raw-port", type=int, default=5001, help="Port raw socket cho app Android (mặc định: 5001)")
     parser.add_argument("--monitor", type=int, default=None, help="Monitor index (mặc định: tự động)")
@@ -729,6 +1161,14 @@ Ví dụ:
     CONFIG["usb_mode"] = args.usb
     CONFIG["monitor_index"] = args.monitor
     CONFIG["use_dxcam"] = not args.no_dxcam
+    CONFIG["encoder"] = args.encoder
+    CONFIG["chroma"] = args.chroma
+    CONFIG["capture_core"] = args.capture_core
+    CONFIG["encode_core"] = args.encode_core
+
+    # Chế độ USB: ưu tiên latency, tăng priority cả process
+    if args.usb:
+        raise_process_priority()
 
     # Build region
     region = build_monitor_region()
@@ -770,6 +1210,7 @@ Ví dụ:
     print(f"   Scale: {CONFIG['scale']} ({int(CONFIG['scale']*100)}%)")
     print(f"   Max Bandwidth: {CONFIG['max_bandwidth_kbps']} KB/s")
     print(f"   Adaptive: {CONFIG['adaptive']}")
+    print(f"   Encoder: {CONFIG['encoder']} (chroma {CONFIG['chroma']})")
     print()
     print("📶 KẾT NỐI QUA WI-FI:")
     print(f"   http://{ip}:{port}")
@@ -809,8 +1250,15 @@ Ví dụ:
             raw_server_task.cancel()
             await runner.cleanup()
     
+    # Event loop ít overhead hơn cho nhiều lần write nhỏ:
+    # uvloop trên Linux/macOS. Windows giữ Proactor mặc định: selector loop không
+    # đăng ký signal.set_wakeup_fd nên Ctrl+C không đánh thức được select() khi rảnh.
+    # Dùng loop_factory cho Runner thay vì đổi event loop policy của cả process
+    loop_factory = uvloop.new_event_loop if HAS_UVLOOP else None
+
     try:
-        asyncio.run(run_servers())
+        with asyncio.Runner(loop_factory=loop_factory) as loop_runner:
+            loop_runner.run(run_servers())
     except KeyboardInterrupt:
         print("\nShutting down...")
 